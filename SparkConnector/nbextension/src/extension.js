@@ -157,7 +157,7 @@ SparkConnector.prototype.on_comm_msg = function (msg) {
             show_page(this, msg.content.data.page);
             break;
         case 'sparkconn-action-follow-log':
-            this.connecting_logs.append(msg.content.data.msg);
+            this.connecting_logs.append(msg.content.data.msgs.join(''));
             this.connecting_logs.scrollTop(this.connecting_logs.get(0).scrollHeight);
             break;
         case 'sparkconn-action-tail-log':
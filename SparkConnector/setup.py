@@ -73,6 +73,7 @@ setup_args = dict(
     install_requires=[
         "jupyterlab>=4.0.0,<5",
         "bs4",
+        "inotify_simple",
         "swanportallocator",
     ],
     zip_safe=False,
@@ -9,6 +9,10 @@ try:
     from kubernetes.client.rest import ApiException
 except ImportError:
     pass
+
+# Parser of the environment variables to replace in the values of the options, e.g. {SPARK_USER}
+_FORMATTER = Formatter()
+
 class SparkConfigurationFactory:
 
     def __init__(self, connector):
@@ -68,12 +72,14 @@ class SparkConfiguration(object):
         _options = {}
         if 'options' in _opts:
             for name, value in _opts['options'].items():
-                replaceable_values = {}
-                for _, variable, _, _ in Formatter().parse(value):
-                    if variable is not None:
-                        replaceable_values[variable] = os.environ.get(variable)
-
-                value = value.format(**replaceable_values)
+                # Most values are not templated (nor have escaped braces), skip parsing them
+                if '{' in value or '}' in value:
+                    replaceable_values = {}
+                    for _, variable, _, _ in _FORMATTER.parse(value):
+                        if variable is not None:
+                            replaceable_values[variable] = os.environ.get(variable)
+
+                    value = value.format(**replaceable_values)
                 _options[name] = value
         return _options
 
@@ -104,6 +110,8 @@ class SparkConfiguration(object):
     def configure(self, opts, ports):
         """ Initializes Spark configuration object """
 
+        env = os.environ
+
         # Check if there's already a conf variablex
         # If using SparkMonitor, this is defined but is of type SparkConf
         conf = self.connector.ipython.user_ns.get('swan_spark_conf')
@@ -141,14 +149,15 @@ class SparkConfiguration(object):
 
         # Extend conf ensuring that LD_LIBRARY_PATH on executors is the same as on the driver
         ld_library_path = conf.get('spark.executorEnv.LD_LIBRARY_PATH')
+        driver_ld_library_path = env.get('LD_LIBRARY_PATH', '')
         if ld_library_path:
-            ld_library_path = ld_library_path + ":" + os.environ.get('LD_LIBRARY_PATH', '')
+            ld_library_path = ld_library_path + ":" + driver_ld_library_path
         else:
-            ld_library_path = os.environ.get('LD_LIBRARY_PATH', '')
+            ld_library_path = driver_ld_library_path
         conf.set('spark.executorEnv.LD_LIBRARY_PATH', ld_library_path)
 
         # Extend conf with ports for the driver and block manager
-        conf.set('spark.driver.host', os.environ.get('SERVER_HOSTNAME', 'localhost'))
+        conf.set('spark.driver.host', env.get('SERVER_HOSTNAME', 'localhost'))
         conf.set('spark.driver.port', ports[0])
         conf.set('spark.driver.blockManager.port', ports[1])
         conf.set('spark.port.maxRetries', 100)
@@ -265,10 +274,13 @@ class SparkK8sConfiguration(SparkConfiguration):
 
         conf = super(self.__class__, self).configure(opts, ports)
 
+        env = os.environ
+        spark_user = env.get('SPARK_USER')
+
         # Set K8s configuration
-        conf.set('spark.kubernetes.namespace', os.environ.get('SPARK_USER'))
+        conf.set('spark.kubernetes.namespace', spark_user)
         conf.set('spark.kubernetes.container.image', 'gitlab-registry.cern.ch/db/spark-service/docker-registry/swan:alma9-20240123')
-        conf.set('spark.master', self._retrieve_k8s_master(os.environ.get('KUBECONFIG')))
+        conf.set('spark.master', self._retrieve_k8s_master(env.get('KUBECONFIG')))
 
         # Configure shuffle if running on K8s with Spark 3.x.x
         if self.get_spark_version().split('.')[0]=='3':
@@ -276,10 +288,10 @@ class SparkK8sConfiguration(SparkConfiguration):
             conf.set('spark.dynamicAllocation.shuffleTracking.enabled', 'true')
 
         # Ensure that Spark ENVs on executors are the same as on the driver
-        conf.set('spark.executorEnv.PYTHONPATH', os.environ.get('PYTHONPATH'))
-        conf.set('spark.executorEnv.JAVA_HOME', os.environ.get('JAVA_HOME'))
-        conf.set('spark.executorEnv.SPARK_HOME', os.environ.get('SPARK_HOME'))
-        conf.set('spark.executorEnv.SPARK_EXTRA_CLASSPATH', os.environ.get('SPARK_DIST_CLASSPATH'))
+        conf.set('spark.executorEnv.PYTHONPATH', env.get('PYTHONPATH'))
+        conf.set('spark.executorEnv.JAVA_HOME', env.get('JAVA_HOME'))
+        conf.set('spark.executorEnv.SPARK_HOME', env.get('SPARK_HOME'))
+        conf.set('spark.executorEnv.SPARK_EXTRA_CLASSPATH', env.get('SPARK_DIST_CLASSPATH'))
 
         # Disable console progress as it would be printed in the notebook (since ipython 6)
         conf.set('spark.ui.showConsoleProgress', 'false')
@@ -287,20 +299,22 @@ class SparkK8sConfiguration(SparkConfiguration):
         # Authenticate EOS and HDFS also on spark executors by
         # telling spark to mount spark-tokens secret to each executor and set env pointing to secret data
         secret_data = {}
-        if "KRB5CCNAME" in os.environ and os.path.exists(os.environ.get('KRB5CCNAME')):
-            secret_data["krb5cc"] = os.environ.get('KRB5CCNAME')
+        krb5ccname = env.get('KRB5CCNAME')
+        if krb5ccname is not None and os.path.exists(krb5ccname):
+            secret_data["krb5cc"] = krb5ccname
             conf.set('spark.kubernetes.executor.secrets.spark-tokens', '/tokens')
             conf.set('spark.executorEnv.KRB5CCNAME', '/tokens/krb5cc')
 
-        if "HADOOP_TOKEN_FILE_LOCATION" in os.environ and os.path.exists(os.environ.get('HADOOP_TOKEN_FILE_LOCATION')):
-            secret_data["hadoop.toks"] = os.environ.get('HADOOP_TOKEN_FILE_LOCATION')
+        hadoop_token_file = env.get('HADOOP_TOKEN_FILE_LOCATION')
+        if hadoop_token_file is not None and os.path.exists(hadoop_token_file):
+            secret_data["hadoop.toks"] = hadoop_token_file
             conf.set('spark.kubernetes.executor.secrets.spark-tokens', '/tokens')
             conf.set('spark.executorEnv.HADOOP_TOKEN_FILE_LOCATION', '/tokens/hadoop.toks')
 
         # Create/replace spark-tokens secret with HADOOP_TOKEN_FILE_LOCATION and KRB5CCNAME if set
         self._refresh_spark_tokens(
             "spark-tokens",
-            os.environ.get('SPARK_USER'),
+            spark_user,
             secret_data
         )
 
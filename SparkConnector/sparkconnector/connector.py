@@ -4,7 +4,7 @@ try:
 except ImportError:
     ipykernel_imported = False
 
-import os, logging, tempfile, subprocess
+import os, logging, tempfile, subprocess, shutil
 from pyspark import SparkContext
 from pyspark.sql import SparkSession
 
@@ -176,20 +176,14 @@ class SparkConnector:
         """ Creates a configuration file for Spark log4j """
 
         fd, path = tempfile.mkstemp()
-        os.close(fd) # Reopen tempfile because mkstemp opens it in binary format
-        f = open(path, 'w')
 
         __location__ = os.path.realpath(
             os.path.join(os.getcwd(), os.path.dirname(__file__)))
-        f_configs = open(os.path.join(__location__, 'log4j_conf'), "r")
 
-        for line in f_configs:
-            f.write(line)
+        with os.fdopen(fd, 'wb') as f, open(os.path.join(__location__, 'log4j_conf'), 'rb') as f_configs:
+            shutil.copyfileobj(f_configs, f, 65536)
+            f.write(b'log4j.appender.file.File=%s\n' % log_path.encode())
 
-        f.write(u'log4j.appender.file.File=%s\n' % log_path)
-
-        f_configs.close()
-        f.close()
         self.log.info("Created temporary Log4j configuration file: %s", path)
 
         return path
@@ -1,15 +1,34 @@
-import os, tempfile, time
-from threading import Thread
+import os, tempfile, time, atexit
+from threading import Thread, Event
+
+try:
+    from inotify_simple import INotify, flags
+except ImportError:
+    INotify = None
 
 
 class LogReader(Thread):
     """ Thread to read a file where the logs from Spark are being written """
 
+    # Limits of a batch of log lines sent to the frontend in a single message
+    BATCH_MAX_LINES = 64
+    BATCH_MAX_SIZE = 16*1024
+    BATCH_FLUSH_INTERVAL = 0.1
+
     def __init__(self, connector, log):
         self.connector = connector
         self.log = log
         self.path = None
-        Thread.__init__(self)
+        self._stop_event = Event()
+        # Do not hold the interpreter exit if the user never connects
+        Thread.__init__(self, daemon=True)
+        atexit.register(self.stop)
+
+    def stop(self):
+        """ Stop following the log file and remove it """
+        self._stop_event.set()
+        if self.path is not None and os.path.exists(self.path):
+            os.unlink(self.path)
 
     def format_log_line(self, line):
         return line.strip() + "\n\n"
@@ -44,24 +63,72 @@ class LogReader(Thread):
         return path
 
     def run(self):
-        """ Read the log file and send the logs to frontend """
-        logfile = open(self.path,"r")
-        log_lines = self.follow(logfile)
-        for line in log_lines:
-            # Add double lines to the log-line for better readability
-            self.connector.send({
-                "msgtype": "sparkconn-action-follow-log",
-                "msg": self.format_log_line(line)
-            })
+        """ Read the log file and send the logs to frontend in batches """
+        batch = []
+        batch_size = 0
+        last_flush = time.monotonic()
+        with open(self.path,"r") as logfile:
+            for line in self.follow(logfile):
+                if line is not None:
+                    # Add double lines to the log-line for better readability
+                    formatted_line = self.format_log_line(line)
+                    batch.append(formatted_line)
+                    batch_size += len(formatted_line)
+
+                # Flush when the end of the file was reached or the batch is full
+                if batch and (line is None
+                              or len(batch) >= self.BATCH_MAX_LINES
+                              or batch_size >= self.BATCH_MAX_SIZE
+                              or time.monotonic() - last_flush >= self.BATCH_FLUSH_INTERVAL):
+                    self.send_log_batch(batch)
+                    batch = []
+                    batch_size = 0
+                    last_flush = time.monotonic()
+
+        if batch and not self._stop_event.is_set():
+            self.send_log_batch(batch)
+
+    def send_log_batch(self, lines):
+        self.connector.send({
+            "msgtype": "sparkconn-action-follow-log",
+            "msgs": lines
+        })
+
+    def watch_file(self):
+        """ Return an inotify watch on the log file, or None if inotify is not available """
+        if INotify is None:
+            self.log.warning("inotify_simple is not installed, polling the log file for changes")
+            return None
+        try:
+            inotify = INotify()
+            inotify.add_watch(self.path, flags.MODIFY)
+            return inotify
+        except OSError:
+            self.log.warning("Could not watch the log file, falling back to polling", exc_info=True)
+            return None
+
+    def wait_for_changes(self, inotify):
+        """ Block until the log file is modified (or a timeout expires, to check the connection state) """
+        if inotify is None:
+            self._stop_event.wait(0.1)
+        else:
+            inotify.read(timeout=1000)
 
     # from "Generator Tricks for Systems Programmers"
     # (http://www.dabeaz.com/generators/)
-    # Terminate when the user is connected
+    # Terminate when the user is connected or the reader is stopped
+    # Yields None when there are no new lines, to allow the caller to flush
     def follow(self, logfile):
         logfile.seek(0,2)
-        while not self.connector.connected:
-            line = logfile.readline()
-            if not line:
-                time.sleep(0.1)
-                continue
-            yield line
\ No newline at end of file
+        inotify = self.watch_file()
+        try:
+            while not (self._stop_event.is_set() or self.connector.connected):
+                line = logfile.readline()
+                if not line:
+                    yield None
+                    self.wait_for_changes(inotify)
+                    continue
+                yield line
+        finally:
+            if inotify is not None:
+                inotify.close()
@@ -207,7 +207,7 @@ export class JupyterLabConnector {
           break;
         }
         case 'sparkconn-action-follow-log': {
-          store.appendConnectionLog(notebookPanel.id, data.msg as string);
+          store.appendConnectionLogs(notebookPanel.id, data.msgs as string[]);
           break;
         }
         case 'sparkconn-action-tail-log': {
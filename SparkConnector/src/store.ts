@@ -125,8 +125,8 @@ class SparkConnectorStore {
     });
   }
 
-  appendConnectionLog(notebookPanelId: string, message: string) {
-    this.notebooks[notebookPanelId as string].logs.push(message);
+  appendConnectionLogs(notebookPanelId: string, messages: string[]) {
+    this.notebooks[notebookPanelId as string].logs.push(...messages);
   }
 
   updateLogs(notebookPanelId: string, logs: string[]) {
@@ -1,7 +1,10 @@
 
 from traitlets import HasTraits, Unicode
 from tornado import web
-import os, io, shutil, subprocess, tempfile, requests
+from contextlib import contextmanager
+from functools import lru_cache
+import os, asyncio, shutil, tempfile, zipfile, requests
+from requests.adapters import HTTPAdapter
 from .proj_url_checker import (
     is_cernbox_shared_link,
     get_name_from_shared_from_link,
@@ -14,6 +17,47 @@ from .proj_url_checker import (
 class InvalidProject(Exception):
     pass
 
+
+# Session shared by all the downloads, to reuse the connections (and TLS handshakes) to the same servers
+_HTTP = requests.Session()
+_HTTP.mount('https://', HTTPAdapter(pool_connections=4, pool_maxsize=8))
+
+
+def _fastcopy(src, dst):
+    """ Copy a file letting the kernel copy the data (and the filesystem do it server side, if supported)
+        instead of reading it in userspace. Falls back to shutil.copy2 if copy_file_range is not available
+    """
+
+    if hasattr(os, 'copy_file_range'):
+        try:
+            copied = 0
+            with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+                while True:
+                    n = os.copy_file_range(fsrc.fileno(), fdst.fileno(), 1 << 30)
+                    if n == 0:
+                        break
+                    copied += n
+
+            # Some filesystems return 0 even if the file is not empty (or its size is not reported),
+            # so only trust the fast path if it copied something. Empty files are cheap to copy again.
+            if copied:
+                shutil.copystat(src, dst)
+                return dst
+        except OSError:
+            pass
+
+    return shutil.copy2(src, dst)
+
+
+@lru_cache(maxsize=128)
+def _split_relative_path(root_dir, path):
+    """ Split a path in its folders, relative to root_dir if it is inside it """
+
+    if path.startswith(root_dir + '/'):
+        path = path[len(root_dir) + 1:]
+    return tuple(path.split('/'))
+
+
 class ProjectsMixin(HasTraits):
 
     swan_default_folder = Unicode("SWAN_projects", config=True,
@@ -28,39 +72,85 @@ class ProjectsMixin(HasTraits):
         help="The base name used when creating untitled projects."
     )
 
+    # Results of the project file lookups and of the file system paths, only set during a contents call
+    _proj_cache = None
+    _os_path_cache = None
+
+    @contextmanager
+    def _contents_call_cache(self):
+        """ Cache the lookups of project files and the file system paths for the duration of a contents call
+            (listing a folder checks the same parent folders once per entry)
+        """
+
+        if self._proj_cache is not None:
+            # Nested call, reuse the cache of the outermost one
+            yield
+            return
+
+        self._proj_cache = {}
+        self._os_path_cache = {}
+        try:
+            yield
+        finally:
+            self._proj_cache = None
+            self._os_path_cache = None
+
+    def _get_os_path(self, path):
+        """ Given an API path, return its file system path, cached during a contents call """
+
+        if self._os_path_cache is None:
+            return super()._get_os_path(path)
+
+        os_path = self._os_path_cache.get(path)
+        if os_path is None:
+            os_path = self._os_path_cache[path] = super()._get_os_path(path)
+        return os_path
+
+    def _is_project(self, path):
+        """ Check if the folder has the project file inside """
+
+        if self._proj_cache is not None and path in self._proj_cache:
+            return self._proj_cache[path]
+
+        is_project = self._is_file(self._get_os_path(os.path.join(path, self.swan_default_file)))
+        if self._proj_cache is not None:
+            self._proj_cache[path] = is_project
+        return is_project
+
     def _get_project_path(self, path):
         """ Return the project path where the path provided belongs to """
 
-        folders = path.replace(self.root_dir+'/', '', 1).split('/')
-        if len(folders) == 0 or folders[0] != self.swan_default_folder:
+        folders = self._rel_parts(path)
+        if folders[0] != self.swan_default_folder:
             raise InvalidProject
 
         path_to_project = folders[0]
         for folder in folders[1:]:
             path_to_project += '/' + folder
-            if self._is_file(self._get_os_path(os.path.join(path_to_project, self.swan_default_file))):
+            if self._is_project(path_to_project):
                 return path_to_project
 
         return None
 
+    def _rel_parts(self, path):
+        """ Return the folders of a path, relative to the root folder """
+
+        return _split_relative_path(self.root_dir, path)
+
     def _is_swan_root_folder(self, path):
         """ Check is this is SWAN projects folder """
 
-        folders = path.replace(self.root_dir+'/', '', 1).split('/')
-        if len(folders) == 2 and folders[0] == self.swan_default_folder:
-            return True
-
-        return False
+        folders = self._rel_parts(path)
+        return len(folders) == 2 and folders[0] == self.swan_default_folder
 
     def _contains_swan_folder_name(self, path):
         """ To prevent users from using the default SWAN projects folder name """
 
-        folders = path.replace(self.root_dir + '/' + self.swan_default_folder + '/', '', 1).split('/')
-        for folder in folders:
-            if folder == self.swan_default_folder:
-                return True
-
-        return False
+        folders = self._rel_parts(path)
+        if len(folders) > 1 and folders[0] == self.swan_default_folder:
+            # Only look inside the SWAN projects folder
+            folders = folders[1:]
+        return self.swan_default_folder in folders
 
     def _dir_model(self, path, content=True):
         """ When returning the info of a folder, add the info of the project to which it belong to (if inside a Project) """
@@ -94,22 +184,28 @@ class ProjectsMixin(HasTraits):
         """
 
         # To avoid having to copy code from upstream, just call parent
-        # and write a file if the path did not exist before.
-        # The drawback is that we need to check if it exists twice...
-        # FIXME maybe not efficient with CS3 calls?
-        create_file = not self.exists(os_path)
-
+        # (it does nothing if the folder already exists) and then write the project file.
         super()._save_directory(os_path, model, path)
 
-        # FIXME if a folder already existed with this name, 
-        # should we also tranform it into a project?
-        if create_file:
-            with self.perm_to_403():
-                self._save_file(os.path.join(os_path, self.swan_default_file), '', 'text')
+        # Create the (empty) project file exclusively, through the file manager, instead of
+        # checking first if the folder existed, which would be one more remote call on EOS/CS3.
+        # An existing folder is thus also transformed into a project.
+        with self.perm_to_403():
+            try:
+                self._create_empty_file(os.path.join(os_path, self.swan_default_file))
+            except FileExistsError:
+                pass
+
+        if self._proj_cache is not None:
+            self._proj_cache[path] = True
 
     def get(self, path, content=True, type=None, format=None):
         """ Get info from a path"""
 
+        with self._contents_call_cache():
+            return self._get_path_model(path, content, type, format)
+
+    def _get_path_model(self, path, content=True, type=None, format=None):
         path = path.strip('/')
 
         if path != self.swan_default_folder and not self.exists(path):
@@ -120,9 +216,7 @@ class ProjectsMixin(HasTraits):
         if path == self.swan_default_folder and not self._is_dir(os_path):
             self._mkdir(os_path)
 
-        os_path_proj = self._get_os_path(os.path.join(path, self.swan_default_file))
-
-        if self._is_dir(os_path) and self._is_file(os_path_proj):
+        if self._is_dir(os_path) and self._is_project(path):
             if type not in (None, 'project', 'directory'):
                 raise web.HTTPError(400,
                                 u'%s is a project, not a %s' % (path, type), reason='bad type')
@@ -136,6 +230,10 @@ class ProjectsMixin(HasTraits):
     def save(self, model, path=''):
         """ Save the file model and return the model with no content """
 
+        with self._contents_call_cache():
+            return self._save_model(model, path)
+
+    def _save_model(self, model, path=''):
         chunk = model.get('chunk', None)
         if chunk is not None:
             return super().save(model, path)
@@ -196,49 +294,164 @@ class ProjectsMixin(HasTraits):
     def update(self, model, path):
         """ Prevent users from using the name of SWAN projects folder"""
 
+        with self._contents_call_cache():
+            return self._update_model(model, path)
+
+    def _update_model(self, model, path):
         if self._contains_swan_folder_name(self._get_os_path(path)):
             raise web.HTTPError(400, "The name %s is restricted" % self.swan_default_folder)
 
         return super().update(model, path)
 
 
+    def _get_available_suffix(self, dest):
+        """ Return the number to append to the destination folder if it already exists (0 if it does not) """
+
+        if not self._is_dir(dest):
+            return 0
+
+        # Find a free suffix with exponential probing followed by a binary search,
+        # to need O(log n) checks instead of one per existing copy.
+        # lo is always taken (0 being the name without suffix) and hi is always free.
+        lo, hi = 0, 1
+        while self._is_dir(dest + str(hi)):
+            lo, hi = hi, hi * 2
+        while lo + 1 < hi:
+            mid = (lo + hi) // 2
+            if self._is_dir(dest + str(mid)):
+                lo = mid
+            else:
+                hi = mid
+        return hi
+
+    def _get_available_folder_name(self, dest):
+        """ Return the destination folder, renamed if it already exists """
+
+        count = self._get_available_suffix(dest)
+        return dest + str(count) if count else dest
+
+    def _reserve_folder(self, dest):
+        """ Create an empty destination folder, renamed if it already exists, and return its path
+            Another download could take the same name at the same time, so keep trying the next
+            names until the folder is created
+        """
+
+        count = self._get_available_suffix(dest)
+        while True:
+            folder = dest + str(count) if count else dest
+            try:
+                self._mkdir(folder)
+                return folder
+            except FileExistsError:
+                count += 1
+
+    def _make_project(self, path):
+        """ Make the folder a SWAN Project """
+        self._save_file(os.path.join(path, self.swan_default_file), '', 'text')
+
+    @contextmanager
+    def _new_project_folder(self, dest):
+        """ Reserve a new folder for a Project and yield its path, which can be renamed if it already exists
+            The folder is made a SWAN Project if the block succeeds, or removed if it fails
+        """
+
+        dest = self._reserve_folder(dest)
+        try:
+            yield dest
+            self._make_project(dest)
+        except BaseException:
+            shutil.rmtree(dest, ignore_errors=True)
+            raise
+
     def move_folder(self, origin, dest, preserve=False):
         """ Move a folder to a new location, but renames it if it already exists """
 
-        # If the name exists, get a new one
-        if self._is_dir(dest):
-            count = 1
-            while self._is_dir(dest + str(count)):
-                count += 1
-            dest += str(count)
+        dest = self._get_available_folder_name(dest)
 
         self._move(origin, dest, preserve)
 
-        # Make the folder a SWAN Project
-        self._save_file(os.path.join(dest, self.swan_default_file), '', 'text')
+        self._make_project(dest)
 
         return dest
 
-    def download(self, url):
+    def _copy_file_to_project(self, file_path, dest_dir_name):
+        """ Copies a file into a new Project (renamed if it already exists) and returns its path """
+
+        with self._new_project_folder(dest_dir_name) as dest_dir_name:
+            dest_file_path = os.path.join(dest_dir_name, os.path.basename(file_path))
+            _fastcopy(file_path, dest_file_path)
+
+        return dest_file_path
+
+    def _download_file(self, url):
+        """ Downloads a file (or zip) from an url into a new Project and returns its path """
+
+        is_on_cernbox = is_cernbox_shared_link(url)
+
+        # Get the file name
+        file_name = os.path.basename(url)
+
+        with _HTTP.get(url, stream=True, timeout=(5, 60)) as r:
+            r.raise_for_status()
+            # Decode the body if the server compressed it (as r.content would)
+            r.raw.decode_content = True
+
+            if is_on_cernbox:
+                file_name = get_name_from_shared_from_link(r)
+
+            # Get the destination folder path
+            file_name_no_ext = os.path.splitext(file_name)[0]
+            dest_dir_name = os.path.join(self.root_dir, self.swan_default_folder, file_name_no_ext)
+
+            # Stream the file with the correct name directly inside the destination folder
+            # or unzip all files if it's compressed, without keeping the whole file in memory
+            with self._new_project_folder(dest_dir_name) as dest_dir_name:
+                if file_name.endswith('.zip'):
+                    # Zip files need to be seekable, so spill them to a temporary file first
+                    with tempfile.TemporaryFile() as zip_file:
+                        shutil.copyfileobj(r.raw, zip_file, 1 << 20)
+                        with zipfile.ZipFile(zip_file) as nb_zip:
+                            nb_zip.extractall(dest_dir_name)
+                    # Change to the notebook file to allow the redirection to open it
+                    file_name = file_name.replace('.zip', '.ipynb')
+
+                else:
+                    nb_path = os.path.join(dest_dir_name, file_name)
+                    with open(nb_path, "w+b") as nb:
+                        shutil.copyfileobj(r.raw, nb, 1 << 20)
+
+        return os.path.join(dest_dir_name, file_name)
+
+    async def download(self, url):
         """ Downloads a Project from git or cernbox """
 
         model = {}
-        tmp_dir_name = tempfile.mkdtemp()
 
         if url.endswith('.git'):
-            # Use subprocess.run instead of subprocess.call as the later one is deprecated and add the "--"
-            # to separate the process arguments from the url, to prevent users from passing command options
-            # in the place of the url.
-            rc = subprocess.run(['git', 'clone', '--recurse-submodules', '--depth=1', '--', url, tmp_dir_name])
-            if rc.returncode != 0:
-                raise web.HTTPError(400, "It was not possible to clone the repo %s. Did you pass the username/token?" % url)
-
             dest_dir_name_ext = os.path.basename(url)
             repo_name_no_ext = os.path.splitext(dest_dir_name_ext)[0]
-            dest_dir_name = os.path.join(self.root_dir, self.swan_default_folder, repo_name_no_ext)
+            # Only the clone itself is awaited here, the (remote) file system calls run in a thread
+            dest_dir_name = await asyncio.to_thread(
+                self._reserve_folder, os.path.join(self.root_dir, self.swan_default_folder, repo_name_no_ext))
+
+            try:
+                # Clone directly into the (empty) destination, to avoid copying the repo from a temporary folder.
+                # Run git as an asyncio subprocess to not block the server while cloning, and add the "--"
+                # to separate the process arguments from the url, to prevent users from passing command options
+                # in the place of the url.
+                proc = await asyncio.create_subprocess_exec(
+                    'git', 'clone', '--recurse-submodules', '--depth=1', '--', url, dest_dir_name)
+                if await proc.wait() != 0:
+                    raise web.HTTPError(400, "It was not possible to clone the repo %s. Did you pass the username/token?" % url)
+
+                await asyncio.to_thread(self._make_project, dest_dir_name)
+
+            except BaseException:
+                await asyncio.to_thread(shutil.rmtree, dest_dir_name, ignore_errors=True)
+                raise
 
             model['type'] = 'directory'
-            model['path'] = self.move_folder(tmp_dir_name, dest_dir_name)
+            model['path'] = dest_dir_name
 
         elif is_file_on_eos(url):
             # Opened from "Open in SWAN" button
@@ -250,14 +463,13 @@ class ProjectsMixin(HasTraits):
                 model['path'] = get_path_without_eos_base(file_path)
 
             else:
-                # Outside of user directory. Copy the file.
-                shutil.copy2(file_path, tmp_dir_name) ##### FIXME
+                # Outside of user directory. Copy the file directly into the new Project.
                 file_name = file_path.split('/').pop()
                 file_name_no_ext = os.path.splitext(file_name)[0]
                 dest_dir_name = os.path.join(self.root_dir, self.swan_default_folder, file_name_no_ext)
 
                 model['type'] = 'file'
-                model['path'] = os.path.join(self.move_folder(tmp_dir_name, dest_dir_name), file_name)
+                model['path'] = await asyncio.to_thread(self._copy_file_to_project, file_path, dest_dir_name)
 
         elif url.startswith('local:'):
             path = url[6:]
@@ -268,50 +480,25 @@ class ProjectsMixin(HasTraits):
                 dest_dir_name = os.path.join(self.root_dir, self.swan_default_folder, file_name)
 
                 model['type'] = 'directory'
-                model['path'] = self.move_folder(path, dest_dir_name, preserve=True)
+                model['path'] = await asyncio.to_thread(self.move_folder, path, dest_dir_name, preserve=True)
 
             elif os.path.isfile(path):
 
-                shutil.copy2(path, tmp_dir_name) ##### FIXME
+                # Copy the file directly into the new Project
                 file_name_no_ext = os.path.splitext(file_name)[0]
                 dest_dir_name = os.path.join(self.root_dir, self.swan_default_folder, file_name_no_ext)
 
                 model['type'] = 'file'
-                model['path'] = os.path.join(self.move_folder(tmp_dir_name, dest_dir_name), file_name)
+                model['path'] = await asyncio.to_thread(self._copy_file_to_project, path, dest_dir_name)
 
             else:
                 raise web.HTTPError(404, u'File or directory does not exist: %s' % path)
 
 
         else:
-            is_on_cernbox = is_cernbox_shared_link(url)
-
-            # Get the file name
-            file_name = os.path.basename(url)
-
-            # Download the file and store it with the correct name inside the temp folder
-            # or unzip all files if it's compressed
-            r = requests.get(url, stream=True)
-            if is_on_cernbox:
-                file_name = get_name_from_shared_from_link(r)
-
-            if file_name.endswith('.zip'):
-                with zipfile.ZipFile(io.BytesIO(r.content)) as nb_zip:
-                    nb_zip.extractall(tmp_dir_name)
-                    # Change to the notebook file to allow the redirection to open it
-                    file_name = file_name.replace('.zip', '.ipynb')
-
-            else:
-                nb_path = os.path.join(tmp_dir_name, file_name)
-                with open(nb_path, "w+b") as nb:
-                    nb.write(r.content)
-
-            # Get the destination folder path
-            file_name_no_ext = os.path.splitext(file_name)[0]
-            dest_dir_name = os.path.join(self.root_dir, self.swan_default_folder, file_name_no_ext)
-
+            # Run the blocking download in a thread, to not block the server while it happens
             model['type'] = 'file'
-            model['path'] = os.path.join(self.move_folder(tmp_dir_name, dest_dir_name), file_name)
+            model['path'] = await asyncio.to_thread(self._download_file, url)
 
         model['path'] = model['path'].replace(self.root_dir, '').strip('/')
 
@@ -36,6 +36,11 @@ class SwanEosFileManager(ProjectsMixin, SwanFileManagerMixin, LargeFileManager):
     def _mkdir(self, path):
         os.mkdir(path)
 
+    def _create_empty_file(self, path):
+        """ Create an empty file, raising FileExistsError if it already exists """
+        with open(path, 'x'):
+            pass
+
     def _move(self, origin, dest, preserve):
         if preserve:
             return shutil.copytree(origin, dest)
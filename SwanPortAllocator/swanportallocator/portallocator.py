@@ -1,4 +1,4 @@
-import os, zmq, time, threading, logging
+import os, zmq, time, threading, logging, errno
 from enum import Enum
 import contextlib
 from socket import (
@@ -115,15 +115,26 @@ class PortAllocator(threading.Thread):
             self.clients[process]['status'] = status
             self.log.info('Update the status of process %s: %s' % (process, status))
 
+    @staticmethod
+    def is_port_in_use(port):
+        """
+            Check if a port is being used by trying to bind to it.
+            Unlike connecting to it, this does not require resolving the hostname nor a TCP handshake.
+            SO_REUSEADDR allows binding over ports in TIME_WAIT (as the ones given by get_reserved_port),
+            so that only ports with a listener are considered in use.
+        """
+        with contextlib.closing(socket()) as s:
+            s.setsockopt(SOL_SOCKET, SO_REUSEADDR, 1)
+            try:
+                s.bind(('', int(port)))
+            except SocketError as e:
+                return e.errno == errno.EADDRINUSE
+            return False
+
     def _check_process(self, process):
         """ Check if at least one port assigned to this client process is being used. If not, remove the client. """
-        s = socket()
         for port in list(self.clients[process]['ports']):
-            try:
-                s.connect((gethostname(), int(port)))
-            except SocketError:
-                pass
-            else:
+            if PortAllocator.is_port_in_use(port):
                 # at least one port is being used, so keep the process info
                 self.log.info('Process %s is using at least one requested port' % process)
                 break
@@ -131,7 +142,6 @@ class PortAllocator(threading.Thread):
             # no port is being used
             self.log.info('Process %s is not using any port' % process)
             self.delete_client(process)
-        s.close()
 
     def check_given_ports_status(self):
         """ 